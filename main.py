@@ -3,90 +3,135 @@ Local LLM Chat with optional MCP file access.
 Chat UI (streaming) + when the user asks about files, call MCP server for list_files or read_file_content.
 """
 
-import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
 import streamlit as st
 from openai import OpenAI
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+try:
+    from streamlit.runtime.scriptrunner_utils.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
+except ImportError:  # older streamlit
+    from streamlit.runtime.scriptrunner.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
 
-import urllib.request
+try:
+    # Optional: the third-party regex engine is a drop-in for the patterns below.
+    import regex as re
+except ImportError:
+    import re
 
 LM_STUDIO_URL = "http://localhost:1234/v1"
 OLLAMA_URL = "http://localhost:11434/v1"
 DEFAULT_MCP_URL = "http://localhost:8000"
+# Seconds to reuse MCP responses when the same files are asked about again.
+MCP_CACHE_TTL = 30
+# Streamed tokens are coalesced: flush after this many tokens or this many seconds, whichever comes first.
+STREAM_FLUSH_TOKENS = 8
+STREAM_FLUSH_SECONDS = 0.03
+
+# Heuristics run on every submitted prompt; compile the patterns once.
+# Every file intent below contains one of these words; most chat prompts contain none.
+_PRESCREEN_RE = re.compile(r"file|read|list|dir|content", re.I)
+_LIST_EXACT = frozenset({"list", "list files", "list dir", "files", "dir", "directory"})
+_LIST_INTENT_RE = re.compile(
+    r"\b(?:list\s+(?:files?|dir(?:ectory)?)|what\s+file|show\s+file|which\s+file|files\s+in|contents\s+of\s+the\s+folder)",
+    re.I,
+)
+# Path after "read file" / "content of": quoted (may contain spaces), or the words up to and including the
+# first token with "." or "/" (dotfiles and ./ or ../ prefixes included).
+_READ_FILE_RE = re.compile(
+    r"\b(?:read\s+file|(?:show\s+)?content\s+of)\s+"
+    r"(?:[\"'](?P<quoted>[^\"']+)[\"']|[\"']?(?P<path>(?:[^\s./]+\s+)*[^\s]*[./][^\s]*))",
+    re.I,
+)
+# Path after a bare "read": quoted, or a single token with "." or "/".
+_READ_RE = re.compile(
+    r"\bread\s+(?:[\"'](?P<quoted>[^\"']+)[\"']|[\"']?(?P<path>[^\s\"']*[./][^\s\"']*))",
+    re.I,
+)
+
+
+def _new_mcp_session() -> requests.Session:
+    """Keep-alive HTTP session for MCP calls (one small pool to the local server)."""
+    session = requests.Session()
+    session.headers["Accept"] = "text/plain"
+    # The MCP server is local: skip the per-request proxy/netrc lookup from the environment.
+    session.trust_env = False
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 
 if "messages" not in st.session_state:
     st.session_state.messages = []
+# Streamlit re-executes this script on every rerun; keep the session (and its sockets) in session state.
+if "mcp_session" not in st.session_state:
+    st.session_state.mcp_session = _new_mcp_session()
+_MCP_SESSION = st.session_state.mcp_session
+
+
+# The cached helpers raise on any failure so that only successful responses are cached;
+# the fetch_* wrappers turn failures into None (or the server's error text), and the next prompt retries.
+@st.cache_data(ttl=MCP_CACHE_TTL, show_spinner=False)
+def _cached_mcp_list_files(mcp_url: str) -> str:
+    """GET mcp_url/list_files.json; return a compact listing (directories end with "/")."""
+    url = mcp_url.rstrip("/") + "/list_files.json"
+    r = _MCP_SESSION.get(url, headers={"Accept": "application/json"}, timeout=10)
+    r.raise_for_status()
+    listing = r.json()
+    names = "\n".join(e["name"] + "/" if e["kind"] == "dir" else e["name"] for e in listing["entries"])
+    return f"Target: {listing['target']}\n\n{names or '(empty)'}"
+
+
+@st.cache_data(ttl=MCP_CACHE_TTL, show_spinner=False)
+def _cached_mcp_read_file(mcp_url: str, path: str) -> str:
+    """GET mcp_url/read_file?path=...; return response text."""
+    url = mcp_url.rstrip("/") + "/read_file"
+    r = _MCP_SESSION.get(url, params={"path": path}, timeout=10)
+    r.raise_for_status()
+    return r.content.decode("utf-8", errors="replace")
 
 
 def fetch_mcp_list_files(mcp_url: str) -> str | None:
-    """GET mcp_url/list_files; return response text or None on error."""
-    url = mcp_url.rstrip("/") + "/list_files"
+    """Return the compact MCP directory listing, or None on error (connection, HTTP status or malformed body)."""
     try:
-        with urllib.request.urlopen(url, timeout=10) as resp:
-            return resp.read().decode("utf-8", errors="replace")
-    except Exception:
+        return _cached_mcp_list_files(mcp_url)
+    except (requests.RequestException, ValueError, KeyError, TypeError):
         return None
 
 
 def fetch_mcp_read_file(mcp_url: str, path: str) -> str | None:
-    """GET mcp_url/read_file?path=...; return response text or None on error."""
-    from urllib.parse import quote
-    url = mcp_url.rstrip("/") + "/read_file?path=" + quote(path, safe="")
+    """Return the text of path from the MCP server, its error message (e.g. not found), or None if unreachable."""
     try:
-        with urllib.request.urlopen(url, timeout=10) as resp:
-            return resp.read().decode("utf-8", errors="replace")
-    except Exception:
+        return _cached_mcp_read_file(mcp_url, path)
+    except requests.HTTPError as e:
+        # The server reports not found / path escapes / read errors with 4xx/5xx; show the text, uncached.
+        return e.response.content.decode("utf-8", errors="replace") or None
+    except requests.RequestException:
         return None
 
 
 def wants_list_files(message: str) -> bool:
     """Heuristic: user is asking to list files/directory."""
-    m = message.lower().strip()
-    if not m:
-        return False
-    if "list file" in m or "list dir" in m or "list directory" in m:
-        return True
-    if "what file" in m or "show file" in m or "which file" in m:
-        return True
-    if m in ("list", "list files", "list dir", "files", "dir", "directory"):
-        return True
-    if "files in" in m or "files in the" in m or "contents of the folder" in m:
-        return True
-    return False
+    m = message.strip().lower()
+    return bool(m) and (m in _LIST_EXACT or _LIST_INTENT_RE.search(m) is not None)
 
 
 def extract_read_file_path(message: str) -> str | None:
     """Extract a file path from 'read file X', 'content of X', 'read X', etc. Handles names with spaces (e.g. 'Costco Expense.xlsx')."""
-    m = message.strip()
-    if not m:
+    # An explicit "read file" / "content of" anywhere wins over an earlier bare "read".
+    match = _READ_FILE_RE.search(message) or _READ_RE.search(message)
+    if not match:
         return None
-    # Quoted path: "read file 'Costco Expense.xlsx'" or 'read file "foo bar.txt"'
-    quoted = re.search(r"(?:read\s+file|content\s+of|read|show\s+content\s+of)\s+[\"']([^\"']+)[\"']", m, re.I)
-    if quoted:
-        return quoted.group(1).strip()
-    # "read file Costco Expense.xlsx" or "read file Costco Expense.xlsx please" -> path can have spaces; end at token that contains "."
-    prefix = re.search(r"(?:read\s+file|content\s+of|show\s+content\s+of)\s+(.+)", m, re.I | re.DOTALL)
-    if prefix:
-        rest = prefix.group(1).strip()
-        # Take tokens until we hit one containing "." (filename extension)
-        tokens = rest.split()
-        for i, t in enumerate(tokens):
-            if "." in t or "/" in t:
-                path = " ".join(tokens[: i + 1]).strip(".,;\"'")
-                if path:
-                    return path
-        if rest and ("." in rest or "/" in rest):
-            return rest.strip(".,;\"'")
-    # "read foo.txt" (single token after "read")
-    match = re.search(r"(?:read\s+file|content\s+of|read|show\s+content\s+of)\s+[\"']?([^\s\"']+(?:\/[^\s\"']+)*)[\"']?", m, re.I)
-    if match:
-        return match.group(1).strip()
-    # Single word that looks like a path
-    words = m.split()
-    for w in words:
-        clean = w.strip(".,;\"'")
-        if "/" in clean or (len(clean) > 1 and "." in clean):
-            return clean
-    return None
+    if match.group("quoted"):
+        return match.group("quoted").strip() or None
+    # Trailing punctuation only: a leading "." is part of "./x", "../x" or ".env".
+    return match.group("path").rstrip(".,;\"'") or None
 
 
 def get_file_context(mcp_url: str, user_message: str) -> str | None:
@@ -94,7 +139,7 @@ def get_file_context(mcp_url: str, user_message: str) -> str | None:
     if wants_list_files(user_message):
         text = fetch_mcp_list_files(mcp_url)
         if text is not None:
-            return "Context from file system (list of files and subdirectories):\n" + text
+            return "Context from file system (list of files and subdirectories; directories end with /):\n" + text
         return None
     path = extract_read_file_path(user_message)
     if path:
@@ -104,6 +149,23 @@ def get_file_context(mcp_url: str, user_message: str) -> str | None:
     return None
 
 
+@st.cache_resource
+def _mcp_executor() -> ThreadPoolExecutor:
+    """Process-wide worker pool for MCP fetches, shared by all sessions."""
+    return ThreadPoolExecutor(max_workers=2)
+
+
+def _get_file_context_in_ctx(ctx, mcp_url: str, user_message: str) -> str | None:
+    """Run get_file_context on a worker thread with the script run context attached (needed by st.cache_data)."""
+    thread = threading.current_thread()
+    add_script_run_ctx(thread, ctx)
+    try:
+        return get_file_context(mcp_url, user_message)
+    finally:
+        # Pool threads outlive the run; detach so they do not keep this session's state alive.
+        setattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+
+
 def render_sidebar():
     with st.sidebar:
         st.header("Settings")
@@ -147,9 +209,18 @@ def stream_completion(client, model, messages, temperature, max_tokens):
         max_tokens=max_tokens,
         stream=True,
     )
+    buf = []
+    last_flush = time.monotonic()
     for chunk in stream:
         if chunk.choices and chunk.choices[0].delta.content is not None:
-            yield chunk.choices[0].delta.content
+            buf.append(chunk.choices[0].delta.content)
+            now = time.monotonic()
+            if len(buf) >= STREAM_FLUSH_TOKENS or now - last_flush > STREAM_FLUSH_SECONDS:
+                yield "".join(buf)
+                buf = []
+                last_flush = now
+    if buf:
+        yield "".join(buf)
 
 
 def show_server_error():
@@ -176,23 +247,29 @@ def main():
 
     base_url, model, temperature, max_tokens, mcp_url = render_sidebar()
 
+    # Every rerun must re-emit the history (Streamlit drops elements a run does not produce);
+    # messages are plain strings, so render them with st.markdown directly.
     for msg in st.session_state.messages:
         with st.chat_message(msg["role"]):
-            st.write(msg["content"])
+            st.markdown(msg["content"])
 
     if prompt := st.chat_input("Message..."):
         st.session_state.messages.append({"role": "user", "content": prompt})
 
-        file_context = get_file_context(mcp_url, prompt)
-        api_messages = []
-        if file_context:
-            api_messages.append({"role": "system", "content": file_context})
-        for m in st.session_state.messages:
-            api_messages.append({"role": m["role"], "content": m["content"]})
+        # Fetch file context on a worker thread while the OpenAI client is set up.
+        # Prompts without any file keyword skip intent detection and the thread hop.
+        file_future = None
+        if _PRESCREEN_RE.search(prompt):
+            file_future = _mcp_executor().submit(_get_file_context_in_ctx, get_script_run_ctx(), mcp_url, prompt)
 
         with st.chat_message("assistant"):
             try:
                 client = OpenAI(base_url=base_url, api_key="not-needed")
+                file_context = file_future.result() if file_future else None
+                # History entries are already {"role", "content"} dicts; send them as-is.
+                api_messages = st.session_state.messages
+                if file_context:
+                    api_messages = [{"role": "system", "content": file_context}] + api_messages
                 full_response = st.write_stream(
                     stream_completion(client, model, api_messages, temperature, max_tokens)
                 )
@@ -5,7 +5,9 @@ Target directory is set via --path.
 
 REST endpoints for chat app:
   GET /list_files  - returns list of files/subdirs (one level)
-  GET /read_file?path=foo.txt  - returns text content of file (path relative to target)
+  GET /list_files.json  - same listing as {"target": ..., "entries": [{"name": ..., "kind": "dir"|"file"}]}
+  GET /read_file?path=foo.txt  - returns text content of file (path relative to target);
+                                 failures return the error text with 403/404/500
 
 Install and run:
     pip install "mcp[cli]"
@@ -16,25 +18,34 @@ Install and run:
 
 import argparse
 import contextlib
+import functools
 import os
+import stat
+from operator import attrgetter
 
 from mcp.server.fastmcp import FastMCP
 from starlette.applications import Starlette
-from starlette.responses import PlainTextResponse
+from starlette.responses import JSONResponse, PlainTextResponse
 from starlette.routing import Mount, Route
 
 # Set by main() after parsing --path
 TARGET_PATH: str = ""
+# Absolute, validated target directory; set once by main() so tool calls skip the re-resolve and stat.
+_RESOLVED_TARGET: str = ""
+
+# Larger files are cut off; their full text would only bloat the chat context.
+_MAX_FILE_BYTES = 256 * 1024
+
+# Formats that cannot be shown as plain text (matched case-insensitively on the filename).
+_EXCEL_SUFFIXES = (".xlsx", ".xls")
+_BINARY_SUFFIXES = (".docx", ".doc", ".pdf", ".zip", ".png", ".jpg", ".jpeg")
 
 
 def _resolve_target() -> str:
-    """Return resolved absolute path of target directory; raise if invalid."""
-    if not TARGET_PATH:
+    """Return resolved absolute path of target directory (validated in main()); raise if not set."""
+    if not _RESOLVED_TARGET:
         raise ValueError("Target path not set (--path required)")
-    resolved = os.path.abspath(os.path.expanduser(TARGET_PATH))
-    if not os.path.isdir(resolved):
-        raise NotADirectoryError(f"Not a directory: {resolved}")
-    return resolved
+    return _RESOLVED_TARGET
 
 
 def _safe_join_and_validate(filename: str) -> str:
@@ -43,7 +54,8 @@ def _safe_join_and_validate(filename: str) -> str:
     # Prevent directory traversal: join and then resolve
     joined = os.path.normpath(os.path.join(base, filename))
     resolved = os.path.abspath(joined)
-    if not resolved.startswith(base):
+    # Compare against base plus separator so a sibling like "<base>EVIL" is not accepted.
+    if resolved != base and not resolved.startswith(os.path.join(base, "")):
         raise PermissionError(f"Path escapes target directory: {filename}")
     return resolved
 
@@ -55,54 +67,91 @@ mcp = FastMCP(
 )
 
 
+def _scan_target(base: str) -> list[os.DirEntry]:
+    """Return the entries of base sorted by name; raise OSError if it cannot be listed."""
+    with os.scandir(base) as it:
+        return sorted(it, key=attrgetter("name"))
+
+
+def _entry_kind(entry: os.DirEntry) -> str:
+    """Return "dir" or "file" for a scanned entry; entries that cannot be stat'ed count as files."""
+    # DirEntry.is_dir() uses the type from the directory read; only symlinks need a stat.
+    try:
+        return "dir" if entry.is_dir() else "file"
+    except OSError:
+        return "file"
+
+
 @mcp.tool()
 def list_files() -> str:
     """Returns a list of all files and subdirectories in the target audit directory (one level)."""
     base = _resolve_target()
     try:
-        entries = os.listdir(base)
+        entries = _scan_target(base)
     except OSError as e:
         return f"Error listing directory: {e}"
-    lines = []
-    for name in sorted(entries):
-        full = os.path.join(base, name)
-        kind = "dir" if os.path.isdir(full) else "file"
-        lines.append(f"  {kind}: {name}")
-    return "Target: " + base + "\n\n" + "\n".join(lines) if lines else "Target: " + base + "\n\n(empty)"
-
-
-def _read_file_as_text(resolved: str, filename: str) -> str:
-    """Read file as text; return a clear message for binary formats (e.g. .xlsx)."""
-    ext = os.path.splitext(filename)[1].lower()
-    if ext in (".xlsx", ".xls"):
+    body = "\n".join(f"  {_entry_kind(entry)}: {entry.name}" for entry in entries)
+    return f"Target: {base}\n\n{body or '(empty)'}"
+
+
+@functools.lru_cache(maxsize=64)
+def _read_text_cached(resolved: str, mtime_ns: int, size: int) -> str:
+    """Read up to _MAX_FILE_BYTES of a file as UTF-8. mtime_ns and size are part of the cache key, so any edit re-reads the file."""
+    # Raw fd read: one syscall for the (capped) size and a single decode, no io buffering layers.
+    # O_BINARY (Windows only): without it the CRT stops at 0x1A and translates CRLF, breaking the size-based cap.
+    fd = os.open(resolved, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        data = os.read(fd, min(size, _MAX_FILE_BYTES))
+    finally:
+        os.close(fd)
+    text = data.decode("utf-8", errors="replace")
+    if size > _MAX_FILE_BYTES:
+        text += "\n...(truncated)"
+    return text
+
+
+def _read_file_as_text(resolved: str, filename: str, info: os.stat_result) -> str:
+    """Read file as text (at most _MAX_FILE_BYTES); return a clear message for binary formats (e.g. .xlsx). Raises OSError."""
+    low = filename.lower()
+    if low.endswith(_EXCEL_SUFFIXES):
         return (
             f"This file is an Excel spreadsheet ({filename}). "
             "I can only display plain text file contents. "
             "Describe the columns or sample entries in the file to get help, or export the sheet to CSV and ask again."
         )
-    if ext in (".docx", ".doc", ".pdf", ".zip", ".png", ".jpg", ".jpeg"):
+    if low.endswith(_BINARY_SUFFIXES):
         return (
             f"This file is binary ({filename}). "
             "I can only display plain text. "
             "Describe what you need (e.g. columns, sample data) to get help."
         )
+    return _read_text_cached(resolved, info.st_mtime_ns, info.st_size)
+
+
+def _read_file_with_status(filename: str) -> tuple[str, int]:
+    """Return (text, HTTP status): file text with 200, or an error message with 403 (escapes target), 404 (not a file) or 500."""
+    try:
+        resolved = _safe_join_and_validate(filename)
+    except PermissionError as e:
+        return f"Error: {e}", 403
+    except (ValueError, NotADirectoryError) as e:
+        return f"Error: {e}", 500
     try:
-        with open(resolved, "r", encoding="utf-8", errors="replace") as f:
-            return f.read()
+        info = os.stat(resolved)
+    except OSError:
+        return f"Not a file or not found: {filename}", 404
+    if not stat.S_ISREG(info.st_mode):
+        return f"Not a file or not found: {filename}", 404
+    try:
+        return _read_file_as_text(resolved, filename, info), 200
     except OSError as e:
-        return f"Error reading file: {e}"
+        return f"Error reading file: {e}", 500
 
 
 @mcp.tool()
 def read_file_content(filename: str) -> str:
     """Read and return the text content of a file in the target audit directory. filename must be relative to the target path (e.g. 'foo.txt' or 'subdir/bar.txt')."""
-    try:
-        resolved = _safe_join_and_validate(filename)
-    except (ValueError, NotADirectoryError, PermissionError) as e:
-        return f"Error: {e}"
-    if not os.path.isfile(resolved):
-        return f"Not a file or not found: {filename}"
-    return _read_file_as_text(resolved, filename)
+    return _read_file_with_status(filename)[0]
 
 
 def _list_files_route(request):
@@ -110,12 +159,26 @@ def _list_files_route(request):
     return PlainTextResponse(list_files())
 
 
+def _list_files_json_route(request):
+    """REST handler: GET /list_files.json."""
+    base = _resolve_target()
+    try:
+        entries = _scan_target(base)
+    except OSError as e:
+        return JSONResponse({"error": f"Error listing directory: {e}"}, status_code=500)
+    return JSONResponse({
+        "target": base,
+        "entries": [{"name": entry.name, "kind": _entry_kind(entry)} for entry in entries],
+    })
+
+
 def _read_file_route(request):
     """REST handler: GET /read_file?path=..."""
     path = request.query_params.get("path", "").strip()
     if not path:
         return PlainTextResponse("Error: missing path query param (e.g. ?path=foo.txt)", status_code=400)
-    return PlainTextResponse(read_file_content(path))
+    text, status = _read_file_with_status(path)
+    return PlainTextResponse(text, status_code=status)
 
 
 @contextlib.asynccontextmanager
@@ -125,7 +188,7 @@ async def _lifespan(app):
 
 
 def main() -> None:
-    global TARGET_PATH
+    global TARGET_PATH, _RESOLVED_TARGET
     parser = argparse.ArgumentParser(description="MCP File Audit Server (list_files, read_file_content)")
     parser.add_argument(
         "--path",
@@ -139,12 +202,14 @@ def main() -> None:
     TARGET_PATH = os.path.abspath(os.path.expanduser(args.path))
     if not os.path.isdir(TARGET_PATH):
         raise SystemExit(f"Error: not a directory: {TARGET_PATH}")
+    _RESOLVED_TARGET = TARGET_PATH
 
     mcp.settings.host = args.host
     mcp.settings.port = args.port
     app = Starlette(
         routes=[
             Route("/list_files", _list_files_route, methods=["GET"]),
+            Route("/list_files.json", _list_files_json_route, methods=["GET"]),
             Route("/read_file", _read_file_route, methods=["GET"]),
             Mount("/", mcp.streamable_http_app()),
         ],
@@ -153,6 +218,7 @@ def main() -> None:
     print(f"Target audit directory: {TARGET_PATH}")
     print(f"Serving MCP + REST at http://{args.host}:{args.port}/")
     print("  GET /list_files   - list files and subdirs")
+    print("  GET /list_files.json - list files and subdirs as JSON")
     print("  GET /read_file?path=... - read file content")
     import uvicorn
     uvicorn.run(app, host=args.host, port=args.port)